@@ -1,15 +1,26 @@
 #!/usr/bin/env python3
 import os
+import sys
 import time
+import atexit
+import signal
+import threading
 import subprocess
 import logging
 import re
 import argparse
-import json
+import itertools
+import orjson
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from watchdog.events import FileSystemEventHandler, EVENT_TYPE_CREATED
 
 # Create logs directory
 LOGS_DIR = Path(__file__).parent / 'logs'
@@ -27,288 +38,631 @@ logging.basicConfig(
     ]
 )
 logger = logging.getLogger(__name__)
-logger.info(f"Log file created: {log_filename}")
+logger.info("Log file created: %s", log_filename)
 
 # State files for web interface
 STATE_DIR = Path(__file__).parent / 'state'
 STATE_DIR.mkdir(exist_ok=True)
 
-QUEUE_FILE = STATE_DIR / 'queue.json'
+QUEUE_LOG = STATE_DIR / 'queue.log'
 CURRENT_FILE = STATE_DIR / 'current.json'
 COMPLETED_FILE = STATE_DIR / 'completed.json'
 ERRORS_FILE = STATE_DIR / 'errors.json'
 
+# Names of watch-directory folders whose files all compressed successfully (JSON lines, kept across restarts)
+PROCESSED_LOG = STATE_DIR / 'processed.log'
+
+# Probed resolutions keyed by path (kept across restarts, unlike the files above)
+RESOLUTION_CACHE_FILE = STATE_DIR / 'resolution_cache.json'
+RESOLUTION_CACHE_SIZE = 5000
+
+# Video extensions accepted by the suffix check (matched case-sensitively)
+VALID_EXTENSIONS = frozenset(('.mp4', '.mkv', '.avi', '.wmv', '.mpg'))
+
+# Every upper/lower-case spelling of the extensions, to spot video files without calling .lower()
+VIDEO_EXTENSIONS_ANY_CASE = frozenset(
+    ''.join(chars)
+    for ext in VALID_EXTENSIONS
+    for chars in itertools.product(*((c.lower(), c.upper()) for c in ext))
+)
+
+# HandbrakeCLI status line, e.g. "Encoding: task 1 of 1, 34.56 % (97.12 fps, avg 95.40 fps, ETA 00h05m12s)"
+PROGRESS_RE = re.compile(r'Encoding:.*?(\d+\.\d+) %(?:.*?ETA ([\dhms]+))?')
+
+# HandbrakeCLI output when the GPU has no free NVEnc session (driver-capped on consumer cards)
+NVENC_SESSION_ERROR = 'OpenEncodeSessionEx failed'
+
+# HandbrakeCLI output lines kept in memory for error reporting
+OUTPUT_TAIL_LINES = 256
+
+# compress_video result for a file that should be retried with fewer concurrent workers
+ENCODER_BUSY = 'encoder-busy'
+
+# First HandbrakeCLI release that accepts --enable-hw-decoding nvdec
+NVDEC_MIN_VERSION = (1, 6)
+VERSION_RE = re.compile(r'HandBrake (\d+)\.(\d+)')
+
+# Default number of concurrent HandbrakeCLI processes
+DEFAULT_WORKERS = 2
+
+# Suffix removed from input names to build the output name (1-2 spaces + xx/XX before the final extension)
+SUFFIX_SUB_RE = re.compile(r'[\s]{1,2}[xX]{2}(?=\.[^.]*$)')
+
+# Empty value for each state file (used when the file is missing or cleared)
+EMPTY_STATE = {
+    CURRENT_FILE: dict,
+    COMPLETED_FILE: list,
+    ERRORS_FILE: list,
+    RESOLUTION_CACHE_FILE: dict,
+}
+
+# Minimum delay between state file writes (seconds)
+FLUSH_INTERVAL = 5
+
+# Compact the queue log once tombstones outnumber live entries by this factor
+QUEUE_COMPACT_RATIO = 2
+
 
 class StateManager:
-    """Manages state files for web interface communication"""
+    """
+    Manages state files for web interface communication.
+    State is kept in memory and written out at most once every
+    FLUSH_INTERVAL seconds; pending changes are flushed on exit.
+    File paths are passed in as strings (callers convert once per file).
+    """
+    
+    _cache = {}
+    _dirty = set()
+    _queue = None
+    _queue_tombstones = 0
+    _timer = None
+    _lock = threading.RLock()
     
     @staticmethod
     def load_json(file_path):
         """Load JSON file, return empty list if not exists"""
         try:
             if file_path.exists():
-                with open(file_path, 'r') as f:
-                    return json.load(f)
+                return orjson.loads(file_path.read_bytes())
         except Exception as e:
-            logger.error(f"Error loading {file_path}: {e}")
+            logger.error("Error loading %s: %s", file_path, e)
         return []
     
+    @staticmethod
+    def write_atomic(file_path, content):
+        """
+        Write bytes to a temp file, fsync it, then swap it into place with os.replace,
+        so a crash leaves either the old or the new file, never a truncated one.
+        """
+        tmp_path = file_path.with_suffix(file_path.suffix + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    
     @staticmethod
     def save_json(file_path, data):
-        """Save data to JSON file"""
+        """Save data to JSON file, replacing the old file atomically. Returns True on success."""
         try:
-            with open(file_path, 'w') as f:
-                json.dump(data, f, indent=2)
+            StateManager.write_atomic(file_path, orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            return True
         except Exception as e:
-            logger.error(f"Error saving {file_path}: {e}")
+            logger.error("Error saving %s: %s", file_path, e)
+            return False
     
     @staticmethod
-    def add_to_queue(file_path):
-        """Add file to processing queue"""
-        queue = StateManager.load_json(QUEUE_FILE)
-        queue.append({
-            'path': str(file_path),
-            'added': datetime.now().isoformat()
-        })
-        StateManager.save_json(QUEUE_FILE, queue)
+    def append_json_line(file_path, record):
+        """Append one JSON record to a JSON-lines log file"""
+        try:
+            with open(file_path, 'ab') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                f.write(orjson.dumps(record) + b'\n')
+        except Exception as e:
+            logger.error("Error appending to %s: %s", file_path, e)
     
     @staticmethod
-    def remove_from_queue(file_path):
-        """Remove file from queue"""
-        queue = StateManager.load_json(QUEUE_FILE)
-        queue = [item for item in queue if item['path'] != str(file_path)]
-        StateManager.save_json(QUEUE_FILE, queue)
+    def load_queue():
+        """
+        Replay the queue log and return (live entries keyed by path, tombstone count).
+        A truncated trailing line from an interrupted append is ignored.
+        """
+        queue = {}
+        tombstones = 0
+        try:
+            if QUEUE_LOG.exists():
+                with open(QUEUE_LOG, 'rb') as f:
+                    for line in f:
+                        try:
+                            record = orjson.loads(line)
+                        except ValueError:
+                            continue
+                        if record.get('op') == 'del':
+                            queue.pop(record['path'], None)
+                            tombstones += 1
+                        else:
+                            queue[record['path']] = {'path': record['path'], 'added': record['added']}
+        except Exception as e:
+            logger.error("Error loading %s: %s", QUEUE_LOG, e)
+        return queue, tombstones
     
-    @staticmethod
-    def set_current(file_path, progress=0, eta='Unknown'):
-        """Update current processing file"""
-        current = {
-            'path': str(file_path),
-            'progress': progress,
-            'eta': eta,
-            'started': datetime.now().isoformat()
+    @classmethod
+    def _get_queue(cls):
+        """Return the live queue, replaying the log on first use"""
+        if cls._queue is None:
+            cls._queue, cls._queue_tombstones = cls.load_queue()
+        return cls._queue
+    
+    @classmethod
+    def _compact_queue(cls):
+        """Rewrite the queue log with only the live entries"""
+        try:
+            cls.write_atomic(QUEUE_LOG, b''.join(orjson.dumps({'op': 'add', **item}) + b'\n'
+                                                 for item in cls._get_queue().values()))
+            cls._queue_tombstones = 0
+        except Exception as e:
+            logger.error("Error compacting %s: %s", QUEUE_LOG, e)
+    
+    @classmethod
+    def _get(cls, file_path):
+        """Return cached state for a file, loading it from disk on first use"""
+        if file_path not in cls._cache:
+            # current.json only describes encodes of this run; anything already on disk was
+            # left by a killed run (possibly in the older single-file format), so start empty
+            data = None if file_path == CURRENT_FILE else cls.load_json(file_path)
+            cls._cache[file_path] = data if data else EMPTY_STATE[file_path]()
+        return cls._cache[file_path]
+    
+    @classmethod
+    def _set(cls, file_path, data):
+        """Replace cached state for a file and schedule a flush"""
+        cls._cache[file_path] = data
+        cls._mark_dirty(file_path)
+    
+    @classmethod
+    def _mark_dirty(cls, file_path):
+        """Schedule a cached file to be written on the next flush"""
+        cls._dirty.add(file_path)
+        if cls._timer is None:
+            cls._timer = threading.Timer(FLUSH_INTERVAL, cls._flush_dirty)
+            cls._timer.daemon = True
+            cls._timer.start()
+    
+    @classmethod
+    def _flush_dirty(cls):
+        """Write every file changed since the last flush; failed writes are retried on the next one"""
+        with cls._lock:
+            cls._timer = None
+            dirty, cls._dirty = cls._dirty, set()
+            for file_path in dirty:
+                if not cls.save_json(file_path, cls._cache[file_path]):
+                    cls._mark_dirty(file_path)
+    
+    @classmethod
+    def _flush_all(cls):
+        """Cancel the pending timer and flush immediately (used at exit)"""
+        with cls._lock:
+            if cls._timer is not None:
+                cls._timer.cancel()
+            cls._flush_dirty()
+    
+    @classmethod
+    def add_to_queue(cls, file_path):
+        """Add file to processing queue"""
+        item = {
+            'path': file_path,
+            'added': datetime.now()
         }
-        StateManager.save_json(CURRENT_FILE, current)
+        with cls._lock:
+            cls._get_queue()[item['path']] = item
+            cls.append_json_line(QUEUE_LOG, {'op': 'add', **item})
     
-    @staticmethod
-    def clear_current():
-        """Clear current processing file"""
-        StateManager.save_json(CURRENT_FILE, {})
+    @classmethod
+    def remove_from_queue(cls, file_path):
+        """Remove file from queue"""
+        with cls._lock:
+            queue = cls._get_queue()
+            if queue.pop(file_path, None) is None:
+                return
+            cls.append_json_line(QUEUE_LOG, {'op': 'del', 'path': file_path})
+            cls._queue_tombstones += 1
+            if cls._queue_tombstones > len(queue) * QUEUE_COMPACT_RATIO:
+                cls._compact_queue()
     
-    @staticmethod
-    def add_completed(file_path, output_path, original_size, compressed_size, started_time):
+    @classmethod
+    def reset_current(cls):
+        """Start this run with no files in progress, overwriting whatever a killed run left in current.json"""
+        with cls._lock:
+            cls._set(CURRENT_FILE, EMPTY_STATE[CURRENT_FILE]())
+    
+    @classmethod
+    def set_current(cls, file_path, progress=0, eta='Unknown'):
+        """Update a file being processed (keeps the original start time on progress updates)"""
+        with cls._lock:
+            current = cls._get(CURRENT_FILE)
+            previous = current.get(file_path)
+            current[file_path] = {
+                'path': file_path,
+                'progress': progress,
+                'eta': eta,
+                'started': previous['started'] if previous else datetime.now()
+            }
+            cls._mark_dirty(CURRENT_FILE)
+    
+    @classmethod
+    def clear_current(cls, file_path):
+        """Remove a file from the files being processed"""
+        with cls._lock:
+            cls._get(CURRENT_FILE).pop(file_path, None)
+            cls._mark_dirty(CURRENT_FILE)
+    
+    @classmethod
+    def add_completed(cls, file_path, output_path, original_size, compressed_size, started_time):
         """Add to completed list"""
-        completed = StateManager.load_json(COMPLETED_FILE)
         completed_time = datetime.now()
+        duration_seconds = (completed_time - started_time).total_seconds()
+        compression_ratio = (original_size - compressed_size) / original_size * 100 if original_size > 0 else 0
         
-        # Calculate duration
-        try:
-            start_dt = datetime.fromisoformat(started_time)
-            duration_seconds = (completed_time - start_dt).total_seconds()
-        except:
-            duration_seconds = 0
-        
-        completed.append({
-            'input': str(file_path),
-            'output': str(output_path),
-            'original_size_mb': round(original_size / (1024*1024), 2),
-            'compressed_size_mb': round(compressed_size / (1024*1024), 2),
-            'started': started_time,
-            'completed': completed_time.isoformat(),
-            'duration_seconds': round(duration_seconds, 1)
-        })
-        StateManager.save_json(COMPLETED_FILE, completed)
+        with cls._lock:
+            cls._get(COMPLETED_FILE).append({
+                'input': file_path,
+                'output': output_path,
+                'original_size_mb': round(original_size / (1024*1024), 2),
+                'compressed_size_mb': round(compressed_size / (1024*1024), 2),
+                'started': started_time,
+                'completed': completed_time,
+                'duration_seconds': round(duration_seconds, 1),
+                'compression_ratio': round(compression_ratio, 1)
+            })
+            cls._mark_dirty(COMPLETED_FILE)
     
-    @staticmethod
-    def add_error(file_path, reason):
+    @classmethod
+    def add_error(cls, file_path, reason):
         """Add to errors list"""
-        errors = StateManager.load_json(ERRORS_FILE)
-        errors.append({
-            'path': str(file_path),
-            'reason': reason,
-            'timestamp': datetime.now().isoformat()
-        })
-        StateManager.save_json(ERRORS_FILE, errors)
+        with cls._lock:
+            cls._get(ERRORS_FILE).append({
+                'path': file_path,
+                'reason': reason,
+                'timestamp': datetime.now()
+            })
+            cls._mark_dirty(ERRORS_FILE)
     
     @staticmethod
-    def clear_all_state():
-        """Clear all state files for fresh start"""
+    def load_processed_folders():
+        """Return the set of folder names recorded as fully processed"""
+        processed = set()
+        try:
+            if PROCESSED_LOG.exists():
+                with open(PROCESSED_LOG, 'rb') as f:
+                    for line in f:
+                        try:
+                            processed.add(sys.intern(orjson.loads(line)['folder']))
+                        except ValueError:
+                            continue
+        except Exception as e:
+            logger.error("Error loading %s: %s", PROCESSED_LOG, e)
+        return processed
+    
+    @classmethod
+    def add_processed_folder(cls, folder_name):
+        """Record a folder as fully processed so it is skipped after a restart"""
+        cls.append_json_line(PROCESSED_LOG, {'folder': folder_name})
+    
+    @classmethod
+    def get_cached_resolution(cls, file_path, stat):
+        """Return the cached height for a file, or None if unknown or the file has changed"""
+        with cls._lock:
+            entry = cls._get(RESOLUTION_CACHE_FILE).get(file_path)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry['height']
+        return None
+    
+    @classmethod
+    def cache_resolution(cls, file_path, stat, height):
+        """Remember the probed height for a file, keyed by its mtime and size"""
+        with cls._lock:
+            cache = cls._get(RESOLUTION_CACHE_FILE)
+            cache.pop(file_path, None)
+            cache[file_path] = {
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'height': height
+            }
+            # Drop the oldest entries once the cache is full
+            while len(cache) > RESOLUTION_CACHE_SIZE:
+                del cache[next(iter(cache))]
+            cls._mark_dirty(RESOLUTION_CACHE_FILE)
+    
+    @classmethod
+    def clear_all_state(cls):
+        """Clear all state files for fresh start (the processed-folder log and resolution cache are kept)"""
         logger.info("Clearing all state files...")
-        StateManager.save_json(QUEUE_FILE, [])
-        StateManager.save_json(CURRENT_FILE, {})
-        StateManager.save_json(COMPLETED_FILE, [])
-        StateManager.save_json(ERRORS_FILE, [])
+        with cls._lock:
+            for file_path in (CURRENT_FILE, COMPLETED_FILE, ERRORS_FILE):
+                cls._set(file_path, EMPTY_STATE[file_path]())
+            cls._flush_all()
+            cls._queue = {}
+            cls._compact_queue()
         logger.info("All state files cleared.")
 
 
+# Write any pending state changes on interpreter exit (including Ctrl+C)
+atexit.register(StateManager._flush_all)
+
+
+def is_valid_suffix(filename):
+    """
+    Check if filename has valid suffix pattern.
+    Pattern: 1-2 spaces followed by 'xx' or 'XX' before extension
+    Supports: .mp4, .mkv, .avi, .wmv, .mpg
+    Examples: "file xx.mp4", "file  XX.mkv", "video  xx.avi"
+    
+    Equivalent to re.search(r'[\s]{1,2}[xX]{2}\.(mp4|mkv|avi|wmv|mpg)$'),
+    but only the fixed-length tail of the name is inspected. Kept at module
+    level so the scan loop calls it directly rather than through a bound method.
+    """
+    # Single-character tests first: they reject most names without slicing out the extension
+    return (
+        len(filename) >= 7
+        and filename[-5] in 'xX'
+        and filename[-6] in 'xX'
+        and filename[-7].isspace()
+        and filename[-4:] in VALID_EXTENSIONS
+    )
+
+
 class VideoFolderHandler(FileSystemEventHandler):
-    def __init__(self, watch_dir, handbrake_path, processed_folders=None):
+    def __init__(self, watch_dir, handbrake_path, processed_folders=None, workers=DEFAULT_WORKERS,
+                 hw_decoding=False):
         self.watch_dir = Path(watch_dir)
+        self.watch_dir_str = str(self.watch_dir)
         self.handbrake_path = handbrake_path
-        self.processed_folders = processed_folders or set()
+        self.processed_folders = processed_folders or StateManager.load_processed_folders()
+        self.workers = workers
+        self.hw_decoding = hw_decoding
+        
+        # Output paths currently being written, so concurrent workers never target the same file
+        self.active_outputs = set()
+        self.output_lock = threading.Lock()
         
         # Process any existing folders that might not have been processed yet
         self.scan_existing_folders()
     
     def scan_existing_folders(self):
         """Scan for existing folders that might need processing"""
-        logger.info(f"Scanning for existing folders in {self.watch_dir}")
-        for item in os.listdir(self.watch_dir):
-            item_path = self.watch_dir / item
-            if item_path.is_dir() and item not in self.processed_folders:
-                self.process_folder(item_path)
+        logger.info("Scanning for existing folders in %s", self.watch_dir)
+        # DirEntry.is_dir() uses the type from the directory listing, so no extra stat per entry
+        with os.scandir(self.watch_dir) as entries:
+            folders = [entry.path for entry in entries
+                       if entry.is_dir() and entry.name not in self.processed_folders]
+        for folder in folders:
+            self.process_folder(Path(folder))
+    
+    def dispatch(self, event):
+        """
+        Only folder creations are handled, so drop every other event here
+        before watchdog looks up a callback for it.
+        """
+        if event.is_directory and event.event_type == EVENT_TYPE_CREATED:
+            super().dispatch(event)
     
     def on_created(self, event):
         """Handle folder creation events"""
-        if not event.is_directory:
-            return
-        
-        folder_path = Path(event.src_path)
-        if folder_path.parent == self.watch_dir:
-            logger.info(f"New folder detected: {folder_path}")
+        # Only direct children of the watch directory; compare strings before building a Path
+        if os.path.dirname(event.src_path) == self.watch_dir_str:
+            folder_path = Path(event.src_path)
+            logger.info("New folder detected: %s", folder_path)
             # Wait a bit to make sure all files are transferred
             time.sleep(5)
             self.process_folder(folder_path)
     
     def process_folder(self, folder_path):
         """Process a newly created folder for video files"""
-        folder_name = folder_path.name
+        # Interned so processed_folders lookups compare by identity first
+        folder_name = sys.intern(folder_path.name)
         
         # Skip if already processed
         if folder_name in self.processed_folders:
-            logger.info(f"Folder {folder_name} already processed, skipping")
+            logger.info("Folder %s already processed, skipping", folder_name)
             return
         
-        logger.info(f"Processing folder: {folder_name}")
+        logger.info("Processing folder: %s", folder_name)
         video_files = self.find_video_files(folder_path)
         
         if not video_files:
-            logger.info(f"No file found matching the required suffix in {folder_path}. Skipping.")
+            logger.info("No file found matching the required suffix in %s. Skipping.", folder_path)
             StateManager.add_error(str(folder_path), "No files with required suffix found")
             return
         
         # Add all files to queue
         for video_file in video_files:
-            StateManager.add_to_queue(video_file)
+            StateManager.add_to_queue(str(video_file))
         
-        # Process each video file
-        for video_file in video_files:
-            self.compress_video(video_file)
+        # Probe resolutions in the background so upcoming files are probed while the current one encodes
+        with ThreadPoolExecutor(max_workers=1) as probe_pool:
+            probes = {video_file: probe_pool.submit(self.get_video_resolution, video_file)
+                      for video_file in video_files}
+            
+            all_succeeded = self.encode_files(video_files, probes)
+        
+        # Remember fully processed folders so a restart does not scan them again
+        if all_succeeded:
+            self.processed_folders.add(folder_name)
+            StateManager.add_processed_folder(folder_name)
     
-    def is_valid_suffix(self, filename):
+    def encode_files(self, video_files, probes):
         """
-        Check if filename has valid suffix pattern.
-        Pattern: 1-2 spaces followed by 'xx' or 'XX' before extension
-        Supports: .mp4, .mkv, .avi, .wmv, .mpg
-        Examples: "file xx.mp4", "file  XX.mkv", "video  xx.avi"
+        Compress files on a pool of self.workers concurrent HandbrakeCLI processes.
+        Files rejected because the GPU ran out of NVEnc sessions are retried with one worker fewer.
+        Returns True if every file was compressed successfully.
         """
-        pattern = r'[\s]{1,2}[xX]{2}\.(mp4|mkv|avi|wmv|mpg)$'
-        return bool(re.search(pattern, filename))
+        all_succeeded = True
+        pending = video_files
+        while pending:
+            with ThreadPoolExecutor(max_workers=self.workers) as encode_pool:
+                results = list(encode_pool.map(
+                    lambda video_file: self.compress_video(video_file, probes[video_file]), pending))
+            
+            all_succeeded = all_succeeded and all(result in (True, ENCODER_BUSY) for result in results)
+            pending = [video_file for video_file, result in zip(pending, results) if result == ENCODER_BUSY]
+            if pending:
+                self.workers = max(1, self.workers - 1)
+                logger.warning("NVEnc session limit reached, retrying %d file(s) with %d worker(s)",
+                               len(pending), self.workers)
+        
+        return all_succeeded
     
     def find_video_files(self, folder_path):
         """Find video files with required suffix in the folder"""
         video_files = []
         
-        for root, _, files in os.walk(folder_path):
-            for file in files:
-                # Check if file has valid suffix
-                if self.is_valid_suffix(file):
-                    video_files.append(Path(root) / file)
-                elif file.lower().endswith(('.mp4', '.mkv', '.avi', '.wmv', '.mpg')):
-                    # File has video extension but wrong suffix - add to errors
-                    file_path = Path(root) / file
-                    logger.warning(f"Skipping '{file}' - missing required suffix pattern")
-                    StateManager.add_error(str(file_path), "Missing required suffix pattern (space + xx/XX)")
+        for file_path, file in self.iter_files(folder_path):
+            # Check if file has valid suffix
+            if is_valid_suffix(file):
+                video_files.append(Path(file_path))
+            elif file[-4:] in VIDEO_EXTENSIONS_ANY_CASE:
+                # File has video extension but wrong suffix - add to errors
+                logger.warning("Skipping '%s' - missing required suffix pattern", file)
+                StateManager.add_error(file_path, "Missing required suffix pattern (space + xx/XX)")
         
         return video_files
     
+    def iter_files(self, folder_path):
+        """
+        Yield (path, name) for every file below folder_path, top-down like os.walk.
+        Uses os.scandir so file/directory checks come from the directory listing
+        instead of a separate stat per entry. Symlinked folders are not followed.
+        """
+        subfolders = []
+        try:
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    if not entry.is_dir():
+                        yield entry.path, entry.name
+                    elif not entry.is_symlink():
+                        subfolders.append(entry.path)
+        except OSError as e:
+            logger.error("Error scanning %s: %s", folder_path, e)
+            return
+        
+        for subfolder in subfolders:
+            yield from self.iter_files(subfolder)
+    
     def get_video_resolution(self, video_path):
         """
         Use ffprobe to get the vertical resolution of the video.
         Returns height in pixels (e.g., 480, 720, 1080)
+        Results are cached by path, mtime and size so unchanged files are not probed again.
         """
+        video_str = str(video_path)
         try:
+            stat = video_path.stat()
+            height = StateManager.get_cached_resolution(video_str, stat)
+            if height is not None:
+                logger.info("Cached resolution: %sp for %s", height, video_path.name)
+                return height
+            
             cmd = [
                 'ffprobe',
                 '-v', 'error',
                 '-select_streams', 'v:0',
                 '-show_entries', 'stream=height',
                 '-of', 'csv=p=0',
-                str(video_path)
+                video_str
             ]
             result = subprocess.run(cmd, capture_output=True, text=True, check=True)
             height = int(result.stdout.strip())
-            logger.info(f"Detected resolution: {height}p for {video_path.name}")
+            logger.info("Detected resolution: %sp for %s", height, video_path.name)
+            StateManager.cache_resolution(video_str, stat, height)
             return height
         except subprocess.CalledProcessError as e:
-            logger.error(f"ffprobe error: {e}")
-            logger.error(f"Error output: {e.stderr}")
+            logger.error("ffprobe error: %s", e)
+            logger.error("Error output: %s", e.stderr)
             return None
         except ValueError as e:
-            logger.error(f"Could not parse resolution: {e}")
+            logger.error("Could not parse resolution: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Unexpected error detecting resolution: {e}")
+            logger.error("Unexpected error detecting resolution: %s", e)
             return None
     
-    def compress_video(self, video_path):
-        """Compress a video file using HandbrakeCLI with NVEnc H.265"""
+    def compress_video(self, video_path, resolution_probe=None):
+        """
+        Compress a video file using HandbrakeCLI with NVEnc H.265.
+        resolution_probe is an optional future for get_video_resolution(video_path) started ahead of time.
+        """
+        # Convert paths to strings once; reused for state updates and the command line
+        video_str = str(video_path)
+        
         # Remove from queue
-        StateManager.remove_from_queue(video_path)
+        StateManager.remove_from_queue(video_str)
         
         # Track start time
-        started_time = datetime.now().isoformat()
+        started_time = datetime.now()
         
         # Set as current
-        StateManager.set_current(video_path, progress=0)
+        StateManager.set_current(video_str, progress=0)
         
         file_name = video_path.name
         
         # Extract new filename by removing the suffix pattern
-        # Match 1-2 spaces followed by xx/XX before extension
-        new_file_name = re.sub(r'[\s]{1,2}[xX]{2}\.', '.', file_name)
+        # Match 1-2 spaces followed by xx/XX before the final extension
+        new_file_name = SUFFIX_SUB_RE.sub('', file_name)
         
         # Use .mp4 as output extension regardless of input
         output_file_name = Path(new_file_name).stem + '.mp4'
         output_path = video_path.parent / output_file_name
+        output_str = str(output_path)
         
-        # Check if output already exists to prevent overwrite
-        if output_path.exists():
-            logger.warning(f"Output file already exists: {output_path}. Skipping to prevent overwrite.")
-            StateManager.add_error(str(video_path), "Output file already exists")
-            StateManager.clear_current()
+        # Check if output already exists (or another worker is writing it) to prevent overwrite
+        with self.output_lock:
+            output_taken = output_path.exists() or output_str in self.active_outputs
+            if not output_taken:
+                self.active_outputs.add(output_str)
+        if output_taken:
+            logger.warning("Output file already exists: %s. Skipping to prevent overwrite.", output_path)
+            StateManager.add_error(video_str, "Output file already exists")
+            StateManager.clear_current(video_str)
             return False
         
-        # Get original file size
-        original_size = video_path.stat().st_size
-        
         # Log the full paths for debugging
-        logger.info(f"Input file path: {video_path}")
-        logger.info(f"Output file path: {output_path}")
-        logger.info(f"Compressing: {file_name} -> {output_file_name}")
+        logger.debug("Input file path: %s", video_str)
+        logger.debug("Output file path: %s", output_str)
+        logger.info("Compressing: %s -> %s", file_name, output_file_name)
         
         # Detect source resolution
-        source_height = self.get_video_resolution(video_path)
+        if resolution_probe is not None:
+            source_height = resolution_probe.result()
+        else:
+            source_height = self.get_video_resolution(video_path)
         
         # Determine if we should downscale
         # If resolution is 540p or lower, keep original resolution
         should_downscale = True
         if source_height is not None and source_height <= 540:
             should_downscale = False
-            logger.info(f"Source resolution ({source_height}p) is ≤540p, keeping original resolution")
+            logger.info("Source resolution (%sp) is ≤540p, keeping original resolution", source_height)
         else:
-            logger.info(f"Source resolution is >540p or unknown, downscaling to 480p")
+            logger.info("Source resolution is >540p or unknown, downscaling to 480p")
         
         # Build HandbrakeCLI command
         cmd = [
             self.handbrake_path,
-            '-i', str(video_path),
-            '-o', str(output_path),
+            '-i', video_str,
+            '-o', output_str,
             '--preset-import-file', 'none',  # Prevent loading user presets
             '-e', 'nvenc_h265',  # Use NVEnc H.265 encoder
             '-q', '22',  # Quality setting
+            '--encoder-preset', 'slow',  # NVEnc quality preset
+            '--encoder-tune', 'hq',  # NVEnc high-quality tuning
+            '-x', 'threads=6:rc-lookahead=32',  # Cap encoder threads, enable rate-control lookahead
         ]
         
+        # Decode on the GPU (NVDEC) so frames are not decoded on the CPU before NVEnc
+        if self.hw_decoding:
+            cmd.extend(['--enable-hw-decoding', 'nvdec'])
+        
         # Add resolution settings
         if should_downscale:
             cmd.extend(['--height', '480'])  # Downscale to 480p
@@ -325,110 +679,92 @@ class VideoFolderHandler(FileSystemEventHandler):
         ])
         
         try:
-            logger.info(f"Running command: {' '.join(str(c) for c in cmd)}")
+            # Get original file size
+            original_size = video_path.stat().st_size
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Running command: %s", subprocess.list2cmdline(cmd))
             
             # Update progress
-            StateManager.set_current(video_path, progress=10, eta='Calculating...')
+            StateManager.set_current(video_str, progress=10, eta='Calculating...')
             
-            # Use shell=True on Windows to help with permissions
-            if os.name == 'nt':  # Windows
-                # Join the command as a string for Windows
-                handbrake_exe = f'"{self.handbrake_path}"'
-                input_file = f'"{video_path}"' 
-                output_file = f'"{output_path}"'
-                
-                # Build command string
-                command_parts = [
-                    handbrake_exe,
-                    '-i', input_file,
-                    '-o', output_file,
-                    '-e nvenc_h265',
-                    '-q 22'
-                ]
-                
-                if should_downscale:
-                    command_parts.append('--height 480')
-                
-                command_parts.extend([
-                    '--keep-display-aspect',
-                    '-O',
-                    '--all-audio',
-                    '--all-subtitles',
-                    '--native-language eng',
-                    '--non-anamorphic'
-                ])
-                
-                command_str = ' '.join(command_parts)
-                logger.info(f"Windows command: {command_str}")
-                
-                # Run with more explicit output handling
-                process = subprocess.Popen(
-                    command_str, 
-                    shell=True, 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.PIPE, 
-                    text=True
-                )
-                
-                # Print output in real-time and update progress
-                logger.info("HandbrakeCLI is running. This may take a while...")
-                
-                # Simulate progress updates (HandbrakeCLI doesn't provide easy progress)
-                for progress in range(20, 90, 10):
-                    if process.poll() is not None:
-                        break
-                    time.sleep(5)
-                    StateManager.set_current(video_path, progress=progress, eta='Processing...')
-                
-                stdout, stderr = process.communicate()
-                
-                if stdout:
-                    logger.info(f"Command output: {stdout}")
-                if stderr:
-                    logger.error(f"Command error output: {stderr}")
-                    
-                if process.returncode != 0:
-                    raise subprocess.CalledProcessError(process.returncode, command_str)
-            else:
-                # Unix/Linux
-                result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-                if result.stdout:
-                    logger.info(f"Command output: {result.stdout}")
+            # Same argument list on every platform; subprocess handles quoting of paths with spaces
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                errors='replace',
+                bufsize=1
+            )
+            logger.info("HandbrakeCLI is running. This may take a while...")
+            
+            # Report real progress from HandbrakeCLI's "Encoding: ... %" status lines.
+            # Other output goes to the debug log; only the last lines are kept for error reports.
+            session_limited = False
+            output_tail = deque(maxlen=OUTPUT_TAIL_LINES)
+            for line in process.stdout:
+                match = PROGRESS_RE.search(line)
+                if match:
+                    StateManager.set_current(video_str, progress=float(match.group(1)),
+                                             eta=match.group(2) or 'Processing...')
+                    continue
+                line = line.rstrip()
+                if not line:
+                    continue
+                logger.debug("%s", line)
+                output_tail.append(line)
+                if NVENC_SESSION_ERROR in line:
+                    session_limited = True
+            
+            returncode = process.wait()
+            if returncode != 0 and session_limited and self.workers > 1:
+                logger.warning("No free NVEnc session for %s, will retry with fewer workers", file_name)
+                if output_path.exists():
+                    output_path.unlink()
+                StateManager.clear_current(video_str)
+                StateManager.add_to_queue(video_str)
+                return ENCODER_BUSY
+            if returncode != 0:
+                raise subprocess.CalledProcessError(returncode, cmd, output='\n'.join(output_tail))
             
             # Update to completion
-            StateManager.set_current(video_path, progress=95, eta='Finalizing...')
+            StateManager.set_current(video_str, progress=95, eta='Finalizing...')
             
             # Verify the output file exists
             if output_path.exists():
                 compressed_size = output_path.stat().st_size
-                logger.info(f"Successfully created output file: {output_path}")
-                logger.info(f"Original size: {original_size / (1024*1024):.2f} MB")
-                logger.info(f"Compressed size: {compressed_size / (1024*1024):.2f} MB")
+                logger.info("Successfully created output file: %s", output_path)
+                logger.info("Original size: %.2f MB", original_size / (1024*1024))
+                logger.info("Compressed size: %.2f MB", compressed_size / (1024*1024))
                 
                 # Add to completed
-                StateManager.add_completed(video_path, output_path, original_size, compressed_size, started_time)
-                StateManager.clear_current()
+                StateManager.add_completed(video_str, output_str, original_size, compressed_size, started_time)
+                StateManager.clear_current(video_str)
             else:
-                logger.error(f"Output file was not created at: {output_path}")
-                StateManager.add_error(str(video_path), "Output file not created")
-                StateManager.clear_current()
+                logger.error("Output file was not created at: %s", output_path)
+                StateManager.add_error(video_str, "Output file not created")
+                StateManager.clear_current(video_str)
                 return False
                 
-            logger.info(f"Compression completed for {file_name}")
+            logger.info("Compression completed for %s", file_name)
             return True
             
         except subprocess.CalledProcessError as e:
-            logger.error(f"HandbrakeCLI error: {e}")
-            if hasattr(e, 'stderr') and e.stderr:
-                logger.error(f"Error output: {e.stderr}")
-            StateManager.add_error(str(video_path), f"HandbrakeCLI error: {str(e)}")
-            StateManager.clear_current()
+            logger.error("HandbrakeCLI error: %s", e)
+            if e.output:
+                logger.error("Error output (last %d lines):\n%s", OUTPUT_TAIL_LINES, e.output)
+            StateManager.add_error(video_str, f"HandbrakeCLI error: {str(e)}")
+            StateManager.clear_current(video_str)
             return False
         except Exception as e:
-            logger.error(f"Unexpected error: {str(e)}")
-            StateManager.add_error(str(video_path), f"Unexpected error: {str(e)}")
-            StateManager.clear_current()
+            logger.error("Unexpected error: %s", e)
+            StateManager.add_error(video_str, f"Unexpected error: {str(e)}")
+            StateManager.clear_current(video_str)
             return False
+        finally:
+            with self.output_lock:
+                self.active_outputs.discard(output_str)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -437,8 +773,15 @@ def main():
     parser.add_argument('--watch', required=True, help='Directory to watch for new folders')
     parser.add_argument('--handbrake', default='HandBrakeCLI', 
                        help='Path to HandbrakeCLI executable (default assumes it is in PATH)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                       help=f'Number of files to encode at the same time (default: {DEFAULT_WORKERS}); '
+                            'reduced automatically if the GPU runs out of NVEnc sessions')
     args = parser.parse_args()
     
+    if args.workers < 1:
+        logger.error("--workers must be at least 1")
+        return 1
+    
     # Full path to HandbrakeCLI executable
     handbrake_path = args.handbrake
     
@@ -446,50 +789,72 @@ def main():
     try:
         test_cmd = [handbrake_path, '--version']
         result = subprocess.run(test_cmd, capture_output=True, text=True)
-        logger.info(f"HandbrakeCLI version: {result.stdout.strip()}")
+        logger.info("HandbrakeCLI version: %s", result.stdout.strip())
     except Exception as e:
-        logger.error(f"Error accessing HandbrakeCLI: {str(e)}")
+        logger.error("Error accessing HandbrakeCLI: %s", e)
         logger.error("Please make sure the path is correct and you have permission to execute it.")
         logger.error("Try running this script as administrator or with elevated privileges.")
         return 1
     
+    # NVDEC hardware decoding needs HandbrakeCLI 1.6 or newer
+    version_match = VERSION_RE.search(result.stdout)
+    hw_decoding = bool(version_match) and (
+        (int(version_match.group(1)), int(version_match.group(2))) >= NVDEC_MIN_VERSION)
+    if hw_decoding:
+        logger.info("NVDEC hardware decoding enabled")
+    else:
+        logger.info("HandbrakeCLI version older than 1.6 or unknown, using software decoding")
+    
     # Verify ffprobe is accessible (for resolution detection)
     try:
         test_cmd = ['ffprobe', '-version']
         result = subprocess.run(test_cmd, capture_output=True, text=True)
-        logger.info(f"ffprobe is available: {result.stdout.split()[0]}")
+        logger.info("ffprobe is available: %s", result.stdout.split()[0])
     except Exception as e:
-        logger.error(f"Error accessing ffprobe: {str(e)}")
+        logger.error("Error accessing ffprobe: %s", e)
         logger.error("ffprobe is required for resolution detection. Please install ffmpeg.")
         return 1
     
     watch_dir = Path(args.watch).resolve()
     
     if not watch_dir.exists() or not watch_dir.is_dir():
-        logger.error(f"Watch directory does not exist: {watch_dir}")
+        logger.error("Watch directory does not exist: %s", watch_dir)
         return 1
     
-    logger.info(f"Starting to monitor: {watch_dir}")
-    logger.info(f"Output will be saved to the same directories as source files")
-    logger.info(f"State files for web interface: {STATE_DIR}")
+    logger.info("Starting to monitor: %s", watch_dir)
+    logger.info("Output will be saved to the same directories as source files")
+    logger.info("State files for web interface: %s", STATE_DIR)
+    StateManager.reset_current()
     
     # Create event handler and observer
-    event_handler = VideoFolderHandler(watch_dir, handbrake_path)
+    event_handler = VideoFolderHandler(watch_dir, handbrake_path, workers=args.workers,
+                                       hw_decoding=hw_decoding)
     observer = Observer()
     observer.schedule(event_handler, str(watch_dir), recursive=False)
     observer.start()
     
-    try:
-        logger.info("Monitoring started. Press Ctrl+C to stop.")
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        logger.info("Monitoring stopped by user.")
-        observer.stop()
-        observer.join()
+    logger.info("Monitoring started. Press Ctrl+C to stop.")
+    if os.name == 'nt':
+        # A blocking join cannot be interrupted on Windows, so wake once a second to catch Ctrl+C
+        try:
+            while observer.is_alive():
+                observer.join(1)
+        except KeyboardInterrupt:
+            observer.stop()
+            observer.join()
+    else:
+        # Sleep in join() until Ctrl+C stops the observer; a second Ctrl+C raises KeyboardInterrupt as usual
+        def request_stop(signum, frame):
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            observer.stop()
         
-        # Clear all state files for clean restart next time
-        StateManager.clear_all_state()
+        signal.signal(signal.SIGINT, request_stop)
+        observer.join()
+    
+    logger.info("Monitoring stopped by user.")
+    
+    # Clear all state files for clean restart next time
+    StateManager.clear_all_state()
     
     logger.info("Script terminated gracefully.")
     return 0
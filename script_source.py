@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+Source-text probes shared by the verification scripts
+"""
+
+import functools
+
+@functools.lru_cache(maxsize=1)
+def script_text():
+    """Read handbrakevidz.py once; every check reuses the same text"""
+    with open('handbrakevidz.py', 'r') as f:
+        return f.read()
+
+def script_has(pattern):
+    """Check whether handbrakevidz.py contains pattern"""
+    return pattern in script_text()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test the append-only queue log (state/queue.log) kept by StateManager
+Runs a copy of handbrakevidz.py from a temporary directory, so its logs/ and
+state/ directories (and every file written here) stay out of the real ones
+"""
+
+import sys
+import shutil
+import logging
+import tempfile
+from pathlib import Path
+
+# handbrakevidz creates logs/ and state/ next to itself on import
+work_dir = Path(tempfile.mkdtemp())
+shutil.copy(Path(__file__).parent / 'handbrakevidz.py', work_dir)
+sys.path.insert(0, str(work_dir))
+
+from handbrakevidz import StateManager, QUEUE_COMPACT_RATIO, QUEUE_LOG
+
+# Report lines, written to stdout in one go at the end
+out = []
+passed = 0
+failed = 0
+
+def check(description, ok):
+    global passed, failed
+    if ok:
+        passed += 1
+    else:
+        failed += 1
+    out.append(f"  {'✓' if ok else '✗'} {description}")
+
+def log_lines():
+    return QUEUE_LOG.read_bytes().splitlines()
+
+
+try:
+    out.append("Queue Log Test")
+    out.append("=" * 70)
+
+    # 1. Add/remove, then replay the log from disk
+    out.append("\n1. Replay after add and remove")
+    StateManager.clear_all_state()
+    for name in ('a xx.mp4', 'b xx.mkv', 'c xx.avi'):
+        StateManager.add_to_queue(f"/videos/{name}")
+    StateManager.remove_from_queue("/videos/b xx.mkv")
+    StateManager.remove_from_queue("/videos/missing xx.mp4")  # not queued - no tombstone written
+
+    queue, tombstones = StateManager.load_queue()
+    check("Live entries are the added paths minus the removed one",
+          set(queue) == {"/videos/a xx.mp4", "/videos/c xx.avi"})
+    check("Entries keep their path and added time",
+          all(item['path'] == path and item['added'] for path, item in queue.items()))
+    check("One tombstone counted", tombstones == 1)
+    check("Log holds 3 adds + 1 tombstone", len(log_lines()) == 4)
+
+    # 2. A truncated trailing line (interrupted append) is skipped
+    out.append("\n2. Truncated last line")
+    with open(QUEUE_LOG, 'ab') as f:
+        f.write(b'{"op":"add","path":"/videos/d xx.mp4","ad')
+
+    queue, tombstones = StateManager.load_queue()
+    check("Truncated record is ignored",
+          set(queue) == {"/videos/a xx.mp4", "/videos/c xx.avi"})
+    check("Tombstone count unchanged", tombstones == 1)
+
+    # 3. Compaction once tombstones exceed QUEUE_COMPACT_RATIO x live entries
+    out.append(f"\n3. Compaction (ratio {QUEUE_COMPACT_RATIO})")
+    StateManager.clear_all_state()
+    check("Clearing state leaves an empty log", log_lines() == [])
+
+    StateManager.add_to_queue("/videos/keep xx.mp4")
+    removed = [f"/videos/drop{i} xx.mp4" for i in range(QUEUE_COMPACT_RATIO + 1)]
+    for path in removed:
+        StateManager.add_to_queue(path)
+
+    # The last removal is the first to push tombstones past ratio x live
+    for path in removed[:-1]:
+        StateManager.remove_from_queue(path)
+    check("Not compacted while tombstones <= ratio x live",
+          len(log_lines()) == 1 + 2 * len(removed) - 1)
+
+    StateManager.remove_from_queue(removed[-1])
+    check("Compacted to the live entries only", len(log_lines()) == 1)
+
+    queue, tombstones = StateManager.load_queue()
+    check("Compacted log replays to the same queue with no tombstones",
+          set(queue) == {"/videos/keep xx.mp4"} and tombstones == 0)
+finally:
+    # Close the log file handler before removing the directory it lives in
+    logging.shutdown()
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+out.append("\n" + "=" * 70)
+out.append(f"\nTest Results: {passed} passed, {failed} failed")
+
+if failed == 0:
+    out.append("✓ All tests passed!")
+else:
+    out.append(f"✗ {failed} test(s) failed!")
+
+sys.stdout.write("\n".join(out) + "\n")
+sys.exit(1 if failed else 0)
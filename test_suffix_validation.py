@@ -4,6 +4,12 @@ Test script to verify suffix validation logic
 """
 
 import re
+import sys
+
+VALID_EXTENSIONS = frozenset(('.mp4', '.mkv', '.avi', '.wmv', '.mpg'))
+
+# Reference pattern, one name per line; [^\S\n] keeps a match from spanning two names
+_SUFFIX_RE_M = re.compile(r'^(.*[^\S\n]{1,2}[xX]{2}\.(?:mp4|mkv|avi|wmv|mpg))$', re.M)
 
 def is_valid_suffix(filename):
     """
@@ -11,9 +17,17 @@ def is_valid_suffix(filename):
     Pattern: 1-2 spaces followed by 'xx' or 'XX' before extension
     Supports: .mp4, .mkv, .avi, .wmv, .mpg
     Examples: "file xx.mp4", "file  XX.mkv", "video  xx.avi"
+    
+    Same tail check as is_valid_suffix in handbrakevidz.py.
     """
-    pattern = r'[\s]{1,2}[xX]{2}\.(mp4|mkv|avi|wmv|mpg)$'
-    return bool(re.search(pattern, filename))
+    # Single-character tests first: they reject most names without slicing out the extension
+    return (
+        len(filename) >= 7
+        and filename[-5] in 'xX'
+        and filename[-6] in 'xX'
+        and filename[-7].isspace()
+        and filename[-4:] in VALID_EXTENSIONS
+    )
 
 
 # Test cases
@@ -44,27 +58,45 @@ test_files = [
     ("video xx.mov", False),  # Unsupported extension
 ]
 
-print("Testing suffix validation logic...\n")
-print("=" * 70)
+# Report lines, written to stdout in one go at the end
+out = []
+
+out.append("Testing suffix validation logic...\n")
+out.append("=" * 70)
+
+# Classify every name against the reference pattern in a single pass
+matches = set(_SUFFIX_RE_M.findall("\n".join(filename for filename, _ in test_files)))
 
-passed = 0
-failed = 0
+try:
+    passed = 0
+    failed = 0
+    mismatched = []
 
-for filename, expected in test_files:
-    result = is_valid_suffix(filename)
-    status = "✓ PASS" if result == expected else "✗ FAIL"
+    for filename, expected in test_files:
+        result = is_valid_suffix(filename)
+        if result != (filename in matches):
+            mismatched.append(filename)
+        status = "✓ PASS" if result == expected else "✗ FAIL"
     
-    if result == expected:
-        passed += 1
-    else:
-        failed += 1
+        if result == expected:
+            passed += 1
+        else:
+            failed += 1
     
-    print(f"{status} | '{filename}' | Expected: {expected}, Got: {result}")
+        out.append(f"{status} | '{filename}' | Expected: {expected}, Got: {result}")
+
+    out.append("=" * 70)
+    out.append(f"\nTest Results: {passed} passed, {failed} failed out of {len(test_files)} tests")
 
-print("=" * 70)
-print(f"\nTest Results: {passed} passed, {failed} failed out of {len(test_files)} tests")
+    if failed == 0:
+        out.append("✓ All tests passed!")
+    else:
+        out.append(f"✗ {failed} test(s) failed!")
 
-if failed == 0:
-    print("✓ All tests passed!")
-else:
-    print(f"✗ {failed} test(s) failed!")
+    if mismatched:
+        out.append(f"✗ is_valid_suffix disagrees with the reference pattern on: {', '.join(mismatched)}")
+    else:
+        out.append("✓ is_valid_suffix agrees with the reference pattern on every case")
+finally:
+    # Write whatever was collected, even if a check raised partway through
+    sys.stdout.write("\n".join(out) + "\n")
@@ -3,22 +3,27 @@
 Comprehensive feature verification for the updated video compression script
 """
 
+import os
 import sys
-from pathlib import Path
 
-def print_section(title):
-    print(f"\n{'=' * 80}")
-    print(f"  {title}")
-    print('=' * 80)
+from script_source import script_has
+
+# Report lines, written to stdout in one go at the end
+out = []
+
+def add_section(title):
+    out.append(f"\n{'=' * 80}")
+    out.append(f"  {title}")
+    out.append('=' * 80)
 
 def check_imports():
     """Verify all required modules can be imported"""
-    print_section("1. MODULE IMPORT CHECK")
+    add_section("1. MODULE IMPORT CHECK")
     
     modules = [
         ('watchdog', 'Folder monitoring'),
         ('streamlit', 'Web interface'),
-        ('json', 'State management'),
+        ('orjson', 'State management'),
         ('subprocess', 'External commands'),
         ('re', 'Regex pattern matching'),
     ]
@@ -27,16 +32,16 @@ def check_imports():
     for module, purpose in modules:
         try:
             __import__(module)
-            print(f"  ✓ {module:15s} - {purpose}")
+            out.append(f"  ✓ {module:15s} - {purpose}")
         except ImportError:
-            print(f"  ✗ {module:15s} - {purpose} [MISSING]")
+            out.append(f"  ✗ {module:15s} - {purpose} [MISSING]")
             all_ok = False
     
     return all_ok
 
 def check_files():
     """Verify all required files exist"""
-    print_section("2. FILE STRUCTURE CHECK")
+    add_section("2. FILE STRUCTURE CHECK")
     
     required_files = [
         ('handbrakevidz.py', 'Main compression script'),
@@ -47,23 +52,22 @@ def check_files():
         ('QUICKSTART.md', 'Quick start guide'),
     ]
     
+    # One directory read instead of a stat per file
+    present = {e.name for e in os.scandir('.') if e.is_file()}
+    
     all_ok = True
     for filename, description in required_files:
-        if Path(filename).exists():
-            print(f"  ✓ {filename:20s} - {description}")
+        if filename in present:
+            out.append(f"  ✓ {filename:20s} - {description}")
         else:
-            print(f"  ✗ {filename:20s} - {description} [MISSING]")
+            out.append(f"  ✗ {filename:20s} - {description} [MISSING]")
             all_ok = False
     
     return all_ok
 
 def verify_features():
     """Verify key features are implemented"""
-    print_section("3. FEATURE IMPLEMENTATION CHECK")
-    
-    # Read the main script
-    with open('handbrakevidz.py', 'r') as f:
-        script_content = f.read()
+    add_section("3. FEATURE IMPLEMENTATION CHECK")
     
     features = [
         ('StateManager', 'State management for web interface'),
@@ -80,20 +84,17 @@ def verify_features():
     
     all_ok = True
     for feature, description in features:
-        if feature in script_content:
-            print(f"  ✓ {description}")
+        if script_has(feature):
+            out.append(f"  ✓ {description}")
         else:
-            print(f"  ✗ {description} [NOT FOUND]")
+            out.append(f"  ✗ {description} [NOT FOUND]")
             all_ok = False
     
     return all_ok
 
 def check_critical_fix():
     """Verify the critical corruption fix is implemented"""
-    print_section("4. CRITICAL FIX VERIFICATION")
-    
-    with open('handbrakevidz.py', 'r') as f:
-        script_content = f.read()
+    add_section("4. CRITICAL FIX VERIFICATION")
     
     checks = [
         ('is_valid_suffix', 'Suffix validation function exists'),
@@ -104,18 +105,18 @@ def check_critical_fix():
     
     all_ok = True
     for pattern, description in checks:
-        if pattern in script_content:
-            print(f"  ✓ {description}")
+        if script_has(pattern):
+            out.append(f"  ✓ {description}")
         else:
-            print(f"  ✗ {description} [NOT FOUND]")
+            out.append(f"  ✗ {description} [NOT FOUND]")
             all_ok = False
     
     return all_ok
 
 def main():
-    print("\n" + "╔" + "═" * 78 + "╗")
-    print("║" + " " * 15 + "VIDEO COMPRESSION SCRIPT - VERIFICATION" + " " * 24 + "║")
-    print("╚" + "═" * 78 + "╝")
+    out.append("\n" + "╔" + "═" * 78 + "╗")
+    out.append("║" + " " * 15 + "VIDEO COMPRESSION SCRIPT - VERIFICATION" + " " * 24 + "║")
+    out.append("╚" + "═" * 78 + "╝")
     
     results = []
     
@@ -126,31 +127,36 @@ def main():
     results.append(("Critical Fix", check_critical_fix()))
     
     # Summary
-    print_section("VERIFICATION SUMMARY")
+    add_section("VERIFICATION SUMMARY")
     
     all_passed = True
     for check_name, passed in results:
         status = "✓ PASS" if passed else "✗ FAIL"
-        print(f"  {status} - {check_name}")
+        out.append(f"  {status} - {check_name}")
         if not passed:
             all_passed = False
     
-    print("\n" + "=" * 80)
+    out.append("\n" + "=" * 80)
     
     if all_passed:
-        print("\n  ✓✓✓ ALL CHECKS PASSED ✓✓✓")
-        print("\n  The script is ready for use!")
-        print("\n  Next steps:")
-        print("    1. Ensure HandbrakeCLI and ffprobe are installed")
-        print("    2. Run: python3 handbrakevidz.py --watch /path/to/directory")
-        print("    3. Run: streamlit run web_monitor.py (optional)")
-        print("\n" + "=" * 80 + "\n")
+        out.append("\n  ✓✓✓ ALL CHECKS PASSED ✓✓✓")
+        out.append("\n  The script is ready for use!")
+        out.append("\n  Next steps:")
+        out.append("    1. Ensure HandbrakeCLI and ffprobe are installed")
+        out.append("    2. Run: python3 handbrakevidz.py --watch /path/to/directory")
+        out.append("    3. Run: streamlit run web_monitor.py (optional)")
+        out.append("\n" + "=" * 80 + "\n")
         return 0
     else:
-        print("\n  ✗✗✗ SOME CHECKS FAILED ✗✗✗")
-        print("\n  Please review the failures above.")
-        print("\n" + "=" * 80 + "\n")
+        out.append("\n  ✗✗✗ SOME CHECKS FAILED ✗✗✗")
+        out.append("\n  Please review the failures above.")
+        out.append("\n" + "=" * 80 + "\n")
         return 1
 
 if __name__ == "__main__":
-    sys.exit(main())
+    try:
+        exit_code = main()
+    finally:
+        # Write whatever was collected, even if a check raised partway through
+        sys.stdout.write("\n".join(out) + "\n")
+    sys.exit(exit_code)
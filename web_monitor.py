@@ -6,7 +6,8 @@ completed files, and any errors or skipped files.
 """
 
 import streamlit as st
-import json
+import orjson
+import os
 import time
 from pathlib import Path
 from datetime import datetime
@@ -23,30 +24,75 @@ st.set_page_config(
 STATE_DIR = Path(__file__).parent / 'state'
 
 # State files
-QUEUE_FILE = STATE_DIR / 'queue.json'
 CURRENT_FILE = STATE_DIR / 'current.json'
 COMPLETED_FILE = STATE_DIR / 'completed.json'
 ERRORS_FILE = STATE_DIR / 'errors.json'
 
+# State files that hold a list (current.json holds a dict)
+_LIST_FILES = {COMPLETED_FILE, ERRORS_FILE}
+
+# Entries shown per page in the completed and errors sections
+PAGE_SIZE = 10
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def parse_json(path, mtime_ns, size):
+    """
+    Parse a state file. Cached by (path, mtime, size) across reruns,
+    so files that have not changed since the last refresh are not parsed again.
+    """
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
 
 def load_json(file_path):
     """Load JSON file, return empty list/dict if not exists"""
     try:
-        if file_path.exists():
-            with open(file_path, 'r') as f:
-                return json.load(f)
+        stat = file_path.stat()
+        return parse_json(str(file_path), stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        pass
     except Exception as e:
         st.error(f"Error loading {file_path}: {e}")
-    return [] if 'queue' in str(file_path) or 'completed' in str(file_path) or 'errors' in str(file_path) else {}
+    return [] if file_path in _LIST_FILES else {}
+
+
+def load_current():
+    """
+    Load the files being processed as a list of entries.
+    Values that are not per-file entries are skipped, e.g. a current.json
+    left behind in the older single-file format by a killed run.
+    """
+    current = load_json(CURRENT_FILE)
+    if not isinstance(current, dict):
+        return []
+    return [item for item in current.values() if isinstance(item, dict) and 'path' in item]
+
+
+@st.cache_resource
+def timestamp_cache():
+    """Formatted timestamps keyed by ISO string; kept across reruns since the strings never change"""
+    return {}
+
+
+# Fetched once per run; the helper's own cache lookup costs more than a dict hit
+_TIMESTAMP_CACHE = timestamp_cache()
+_TIMESTAMP_CACHE_SIZE = 4096
 
 
 def format_timestamp(iso_timestamp):
     """Format ISO timestamp to readable format"""
-    try:
-        dt = datetime.fromisoformat(iso_timestamp)
-        return dt.strftime('%Y-%m-%d %H:%M:%S')
-    except:
-        return iso_timestamp
+    formatted = _TIMESTAMP_CACHE.get(iso_timestamp)
+    if formatted is None:
+        try:
+            dt = datetime.fromisoformat(iso_timestamp)
+            formatted = dt.strftime('%Y-%m-%d %H:%M:%S')
+        except:
+            formatted = iso_timestamp
+        if len(_TIMESTAMP_CACHE) >= _TIMESTAMP_CACHE_SIZE:
+            _TIMESTAMP_CACHE.clear()
+        _TIMESTAMP_CACHE[iso_timestamp] = formatted
+    return formatted
 
 
 def format_duration(seconds):
@@ -67,94 +113,80 @@ def format_duration(seconds):
         return "Unknown"
 
 
-def main():
-    # Header
-    st.title("🎬 Video Compression Monitor")
-    st.markdown("Real-time monitoring of NVEnc H.265 video compression tasks")
-    
-    # Auto-refresh control in sidebar
-    st.sidebar.title("Settings")
-    auto_refresh = st.sidebar.checkbox("Auto-refresh", value=True)
-    refresh_rate = st.sidebar.slider("Refresh rate (seconds)", 1, 10, 3)
-    
-    # Manual refresh button
-    if st.sidebar.button("🔄 Refresh Now"):
-        st.rerun()
-    
-    # Check if state directory exists
-    if not STATE_DIR.exists():
-        st.warning("⚠️ State directory not found. Make sure the main script (handbrakevidz.py) is running.")
-        st.info(f"Expected state directory: {STATE_DIR}")
-        time.sleep(refresh_rate)
-        if auto_refresh:
-            st.rerun()
-        return
-    
-    # Load all state data
-    current = load_json(CURRENT_FILE)
+def render_stats():
+    """Display stats in columns"""
+    current = load_current()
     completed = load_json(COMPLETED_FILE)
     errors = load_json(ERRORS_FILE)
     
-    # Display stats in columns
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        is_processing = bool(current and 'path' in current)
-        st.metric("Processing", "Yes" if is_processing else "No")
+        st.metric("Processing", len(current))
     
     with col2:
         st.metric("Completed", len(completed))
     
     with col3:
         st.metric("Errors/Skipped", len(errors))
+
+
+def render_current():
+    """Current Processing Section"""
+    current = load_current()
     
-    st.markdown("---")
-    
-    # Current Processing Section
     st.header("🎥 Current Processing")
-    if current and 'path' in current:
-        file_path = Path(current['path'])
-        
-        col1, col2 = st.columns([3, 1])
-        
-        with col1:
-            st.subheader(f"📁 {file_path.name}")
-            st.text(f"Path: {file_path.parent}")
-            st.text(f"Started: {format_timestamp(current.get('started', 'Unknown'))}")
-        
-        with col2:
-            progress = current.get('progress', 0)
-            eta = current.get('eta', 'Unknown')
-            st.metric("Progress", f"{progress}%")
-            st.text(f"ETA: {eta}")
-        
-        # Progress bar
-        st.progress(progress / 100)
+    if current:
+        # One entry per file being encoded, keyed by path
+        for item in current:
+            file_path = item['path']
+            
+            col1, col2 = st.columns([3, 1])
+            
+            with col1:
+                st.subheader(f"📁 {os.path.basename(file_path)}")
+                st.text(f"Path: {os.path.dirname(file_path)}")
+                st.text(f"Started: {format_timestamp(item.get('started', 'Unknown'))}")
+            
+            with col2:
+                progress = item.get('progress', 0)
+                eta = item.get('eta', 'Unknown')
+                st.metric("Progress", f"{progress}%")
+                st.text(f"ETA: {eta}")
+            
+            # Progress bar
+            st.progress(progress / 100)
     else:
         st.info("No file currently being processed")
+
+
+def render_completed():
+    """Completed Section"""
+    completed = load_json(COMPLETED_FILE)
     
-    st.markdown("---")
-    
-    # Completed Section
     st.header("✅ Completed Files")
     if completed:
         st.write(f"**{len(completed)} file(s) successfully processed**")
         
-        # Show last 10 completed files by default
-        show_all_completed = st.checkbox("Show all completed files", value=False)
-        display_completed = completed if show_all_completed else completed[-10:]
+        # Newest first, one page at a time
+        max_pages = (len(completed) + PAGE_SIZE - 1) // PAGE_SIZE
+        page = st.number_input("Page", 1, max_pages, 1, key="completed_page")
+        display_completed = completed[-page * PAGE_SIZE:-(page - 1) * PAGE_SIZE or None]
         
-        for idx, item in enumerate(reversed(display_completed), 1):
-            input_path = Path(item['input'])
-            output_path = Path(item['output'])
+        for idx, item in enumerate(reversed(display_completed), (page - 1) * PAGE_SIZE + 1):
+            input_path = item['input']
+            output_path = item['output']
             original_size = item.get('original_size_mb', 0)
             compressed_size = item.get('compressed_size_mb', 0)
-            compression_ratio = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
+            # Recorded by the encoder; older entries predate the field
+            compression_ratio = item.get('compression_ratio')
+            if compression_ratio is None:
+                compression_ratio = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
             started_time = format_timestamp(item.get('started', 'Unknown'))
             completed_time = format_timestamp(item.get('completed', 'Unknown'))
             duration = format_duration(item.get('duration_seconds', 0))
             
-            with st.expander(f"{idx}. {input_path.name} → {output_path.name}"):
+            with st.expander(f"{idx}. {os.path.basename(input_path)} → {os.path.basename(output_path)}"):
                 col1, col2 = st.columns(2)
                 
                 with col1:
@@ -171,34 +203,68 @@ def main():
                 st.text(f"Compression Ratio: {compression_ratio:.1f}% reduction")
     else:
         st.info("No files completed yet")
+
+
+def render_errors():
+    """Errors/Skipped Section"""
+    errors = load_json(ERRORS_FILE)
     
-    st.markdown("---")
-    
-    # Errors/Skipped Section
     st.header("⚠️ Errors & Skipped Files")
     if errors:
         st.write(f"**{len(errors)} error(s) or skipped file(s)**")
         
-        # Show last 10 errors by default
-        show_all_errors = st.checkbox("Show all errors", value=False)
-        display_errors = errors if show_all_errors else errors[-10:]
+        # Newest first, one page at a time
+        max_pages = (len(errors) + PAGE_SIZE - 1) // PAGE_SIZE
+        page = st.number_input("Page", 1, max_pages, 1, key="errors_page")
+        display_errors = errors[-page * PAGE_SIZE:-(page - 1) * PAGE_SIZE or None]
         
-        for idx, item in enumerate(reversed(display_errors), 1):
+        for idx, item in enumerate(reversed(display_errors), (page - 1) * PAGE_SIZE + 1):
             file_path = item['path']
             reason = item.get('reason', 'Unknown')
             timestamp = format_timestamp(item.get('timestamp', 'Unknown'))
             
-            with st.expander(f"{idx}. {Path(file_path).name}", expanded=False):
+            with st.expander(f"{idx}. {os.path.basename(file_path)}", expanded=False):
                 st.error(f"**Reason:** {reason}")
                 st.text(f"Path: {file_path}")
                 st.text(f"Time: {timestamp}")
     else:
         st.success("No errors or skipped files")
+
+
+def main():
+    # Header
+    st.title("🎬 Video Compression Monitor")
+    st.markdown("Real-time monitoring of NVEnc H.265 video compression tasks")
     
-    # Auto-refresh at the end
-    if auto_refresh:
-        time.sleep(refresh_rate)
+    # Auto-refresh control in sidebar
+    st.sidebar.title("Settings")
+    auto_refresh = st.sidebar.checkbox("Auto-refresh", value=True)
+    refresh_rate = st.sidebar.slider("Refresh rate (seconds)", 1, 10, 3)
+    
+    # Manual refresh button
+    if st.sidebar.button("🔄 Refresh Now"):
         st.rerun()
+    
+    # Check if state directory exists
+    if not STATE_DIR.exists():
+        st.warning("⚠️ State directory not found. Make sure the main script (handbrakevidz.py) is running.")
+        st.info(f"Expected state directory: {STATE_DIR}")
+        time.sleep(refresh_rate)
+        if auto_refresh:
+            st.rerun()
+        return
+    
+    # Each section reruns on its own timer and reads only the state it shows;
+    # the rest of the page is left alone between refreshes
+    run_every = refresh_rate if auto_refresh else None
+    
+    st.fragment(render_stats, run_every=run_every)()
+    st.markdown("---")
+    st.fragment(render_current, run_every=run_every)()
+    st.markdown("---")
+    st.fragment(render_completed, run_every=run_every)()
+    st.markdown("---")
+    st.fragment(render_errors, run_every=run_every)()
 
 
 if __name__ == "__main__":